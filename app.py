@@ -7,18 +7,33 @@ Run the FastAPI application for compliance document analysis.
 
 import uvicorn
 from compliance_agent.api import app
+from compliance_agent.config import settings
 
 
 def main():
     """Start the FastAPI server."""
-    # Configure for production
+    if settings.api_reload:
+        # Development: single auto-reloading process
+        uvicorn.run(
+            "compliance_agent.api:app",
+            host=settings.api_host,
+            port=settings.api_port,
+            reload=True,
+            log_level="info",
+            access_log=True
+        )
+        return
+
+    # Production: uvloop event loop + httptools parser, no access log formatting
     uvicorn.run(
         "compliance_agent.api:app",
-        host="0.0.0.0",
-        port=6333,
-        reload=True,  # Set to False in production
-        log_level="info",
-        access_log=True
+        host=settings.api_host,
+        port=settings.api_port,
+        loop="uvloop",
+        http="httptools",
+        workers=settings.api_workers,
+        log_level="warning",
+        access_log=False
     )
 
 
@@ -2,7 +2,7 @@
 
 from .config import settings
 from .models import ComplianceRequirement, ControlSuggestion, AnalysisResult, TaskStatus
-from .document_loader import detect_document_type, load_and_chunk_pdf
-from .extractor import orchestrate_compliance_analysis
+from .document_loader import detect_document_type, load_and_chunk_pdf, aload_and_chunk_pdf, load_and_chunk_pdfs
+from .extractor import orchestrate_compliance_analysis, aorchestrate_compliance_analysis
 
 __version__ = "1.0.0"
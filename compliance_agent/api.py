@@ -1,35 +1,120 @@
+import asyncio
 import logging
 import uuid
-import json
-from typing import Optional, Any, Dict
+from typing import Optional
 from datetime import datetime
 import os
 
-from fastapi import FastAPI, File, UploadFile, BackgroundTasks, HTTPException
-from fastapi.responses import FileResponse
+import aiofiles
+import orjson
+from fastapi import FastAPI, File, UploadFile, BackgroundTasks, HTTPException, Request
+from fastapi.responses import FileResponse, ORJSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
+from .config import settings
 from .models import TaskStatus, AnalysisResult
-from .extractor import orchestrate_compliance_analysis
+from .extractor import aorchestrate_compliance_analysis
+from .task_store import TaskStore
+from .storage import STREAM_CHUNK_SIZE, is_compressed, iter_json_bytes, write_json
 
-# In-memory task store (use Redis/DB in production)
-task_store: dict[str, TaskStatus] = {}
+# Task store shared across workers (Redis when REDIS_URL is set)
+task_store = TaskStore(settings.redis_url)
 
 
-def serialize_for_json(obj: Dict[str, Any]) -> Dict[str, Any]:
-    """Convert datetime objects to ISO strings for JSON serialization."""
-    if isinstance(obj, dict):
-        return {k: serialize_for_json(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [serialize_for_json(item) for item in obj]
-    elif isinstance(obj, datetime):
-        return obj.isoformat()
-    else:
-        return obj
+def write_results(analysis_result: AnalysisResult, path: str) -> None:
+    """Write final analysis results as compressed JSON (orjson handles datetimes natively)."""
+    write_json(analysis_result.model_dump(), path)
+
+
+def accepts_encoding(accept_encoding: str, encoding: str) -> bool:
+    """Return whether an Accept-Encoding header explicitly lists encoding with q > 0."""
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        if name.strip().lower() != encoding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        return quality > 0
+    return False
+
+
+class UploadTooLarge(Exception):
+    """Raised while reading a request body that exceeds the upload limit."""
+
+
+class UploadSizeLimitMiddleware:
+    """Reject request bodies over max_upload_bytes before the app parses them.
+
+    Starlette spools the whole multipart body to a temporary file before the
+    endpoint runs, so the limit has to be enforced here: up front from
+    Content-Length when the client sends it, otherwise while the body streams in.
+    """
+
+    def __init__(self, app, max_upload_bytes: int):
+        self.app = app
+        self.max_upload_bytes = max_upload_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_upload_bytes:
+            return await self.reject(scope, receive, send)
+
+        received = 0
+        too_large = False
+        response_started = False
+        replaced = False  # The app's response was swapped for our 413
+
+        async def limited_receive():
+            nonlocal received, too_large
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_upload_bytes:
+                    too_large = True
+                    raise UploadTooLarge()
+            return message
+
+        async def limited_send(message):
+            nonlocal response_started, replaced
+            if message["type"] == "http.response.start" and too_large and not response_started:
+                # FastAPI turns any error while parsing the form (including
+                # UploadTooLarge) into a 400; answer with the 413 instead
+                replaced = response_started = True
+                await self.reject(scope, receive, send)
+                return
+            if replaced:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, limited_send)
+        except UploadTooLarge:
+            if response_started and not replaced:
+                raise
+            if not response_started:
+                await self.reject(scope, receive, send)
+
+    async def reject(self, scope, receive, send):
+        response = ORJSONResponse(
+            {"detail": f"File too large (max {settings.max_upload_mb}MB)"},
+            status_code=413
+        )
+        await response(scope, receive, send)
 
 
 # Validate settings on startup
-from .config import settings
 try:
     settings.validate_llm_provider()
     print(f"✓ LLM provider configured: {settings.llm_provider}")
@@ -40,7 +125,8 @@ except ValueError as e:
 app = FastAPI(
     title="Ascent Compliance Agent Network API",
     description="AI-powered compliance document analysis for requirements extraction and control suggestions",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware to allow all origins
@@ -52,6 +138,9 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+# Enforce the upload limit before the multipart body is spooled to disk
+app.add_middleware(UploadSizeLimitMiddleware, max_upload_bytes=settings.max_upload_mb * 1024 * 1024)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -76,39 +165,38 @@ async def analyze_pdf(
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="File must be a PDF")
 
-    # Read file content to check size
-    content = await file.read()
-    file_size_mb = len(content) / (1024 * 1024)
-    sync_processing = file_size_mb < 5.0  # Process small files synchronously
-
     # Generate task ID
     task_id = str(uuid.uuid4())
 
-    # Save uploaded file temporarily
+    # Oversize uploads were already rejected by UploadSizeLimitMiddleware.
+    # Copy the spooled upload to disk without buffering it in memory
     temp_path = f"temp_{task_id}.pdf"
+    file_size = 0
     try:
-        with open(temp_path, "wb") as buffer:
-            buffer.write(content)
+        async with aiofiles.open(temp_path, "wb") as buffer:
+            while chunk := await file.read(STREAM_CHUNK_SIZE):
+                file_size += len(chunk)
+                await buffer.write(chunk)
     except Exception as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
         raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
 
+    file_size_mb = file_size / (1024 * 1024)
+    sync_processing = file_size_mb < 5.0  # Process small files before responding
+
     if sync_processing:
         # Process immediately for small files
         try:
             logging.info(f"Processing small file synchronously: {file.filename} ({file_size_mb:.1f}MB)")
 
-            # Import processing function
-            from .extractor import orchestrate_compliance_analysis
+            # Intermediate file named per task so concurrent analyses never share it
+            intermediate_filename = f"intermediate_{task_id}.json.zst"
 
-            # Create timestamped intermediate file
-            timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            intermediate_filename = f"intermediate_{timestamp}.json"
-
-            # Run analysis synchronously
-            llm_result = orchestrate_compliance_analysis(temp_path, intermediate_filename)
+            # Run analysis before responding
+            llm_result = await aorchestrate_compliance_analysis(temp_path, intermediate_filename)
 
             # Create final result structure
-            from .models import AnalysisResult
             analysis_result = AnalysisResult(
                 document_name=file.filename,
                 total_chunks=0,  # Not tracked in current implementation
@@ -119,22 +207,21 @@ async def analyze_pdf(
                 updated_at=datetime.now()
             )
 
-            # Save final results (serialize datetime objects)
-            final_filename = f"results_{task_id}.json"
-            with open(final_filename, 'w', encoding='utf-8') as f:
-                json.dump(serialize_for_json(analysis_result.model_dump()), f, indent=2, ensure_ascii=False, default=str)
+            # Save final results
+            final_filename = f"results_{task_id}.json.zst"
+            await asyncio.to_thread(write_results, analysis_result, final_filename)
 
             # Clean up temp file
             if os.path.exists(temp_path):
                 os.remove(temp_path)
 
-            # Return immediate results
-            return {
+            # Return immediate results, serialized by orjson in a single pass
+            return ORJSONResponse({
                 "status": "completed",
                 "message": f"Analysis completed for {file.filename}",
                 "processing_mode": "synchronous",
-                "results": serialize_for_json(analysis_result.model_dump())
-            }
+                "results": analysis_result.model_dump()
+            })
 
         except Exception as e:
             # Clean up on error
@@ -155,7 +242,7 @@ async def analyze_pdf(
             message="Analysis queued (large file)",
             created_at=datetime.now()
         )
-        task_store[task_id] = task_status
+        await task_store.create(task_status)
 
         # Start background processing
         background_tasks.add_task(process_pdf_analysis, task_id, temp_path, file.filename)
@@ -169,56 +256,57 @@ async def analyze_pdf(
 
 
 @app.get("/status/{task_id}", summary="Get analysis status")
-def get_analysis_status(task_id: str) -> TaskStatus:
+async def get_analysis_status(task_id: str) -> TaskStatus:
     """
     Get the current status of a compliance analysis task.
     """
-    if task_id not in task_store:
+    task_status = await task_store.get(task_id)
+    if task_status is None:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    return task_store[task_id]
+    return task_status
+
+
+def stream_results(task_id: str, result_path: str):
+    """Stream the stored results file wrapped in the response envelope, without re-parsing it."""
+    yield b'{"task_id": ' + orjson.dumps(task_id) + b', "results": '
+    yield from iter_json_bytes(result_path)
+    yield b'}'
 
 
 @app.get("/results/{task_id}", summary="Get analysis results")
-def get_analysis_results(task_id: str) -> dict:
+async def get_analysis_results(task_id: str) -> Response:
     """
     Get the final results of a completed analysis.
     """
-    if task_id not in task_store:
+    task_status = await task_store.get(task_id)
+    if task_status is None:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    task_status = task_store[task_id]
-
     if task_status.status != "completed":
         raise HTTPException(status_code=412, detail=f"Analysis not completed. Status: {task_status.status}")
 
     if not task_status.result_path or not os.path.exists(task_status.result_path):
         raise HTTPException(status_code=500, detail="Results file not found")
 
-    try:
-        with open(task_status.result_path, 'r', encoding='utf-8') as f:
-            results = json.load(f)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to load results: {str(e)}")
-
-    return {
-        "task_id": task_id,
-        "results": results
-    }
+    # The file is already valid JSON written by orjson, so it is only decompressed
+    return StreamingResponse(stream_results(task_id, task_status.result_path), media_type="application/json")
 
 
 @app.get("/download/{task_id}/{file_type}", summary="Download analysis files")
-def download_file(task_id: str, file_type: str) -> FileResponse:
+async def download_file(task_id: str, file_type: str, request: Request) -> Response:
     """
     Download intermediate or final results file.
 
     file_type: "intermediate" or "final"
+
+    Compressed files are sent as-is with Content-Encoding: zstd when the
+    client accepts it, otherwise decompressed on the fly.
     """
-    if task_id not in task_store:
+    task_status = await task_store.get(task_id)
+    if task_status is None:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    task_status = task_store[task_id]
-
     if file_type == "intermediate":
         file_path = task_status.intermediate_path
         filename = f"intermediate_{task_id}.json"
@@ -231,10 +319,21 @@ def download_file(task_id: str, file_type: str) -> FileResponse:
     if not file_path or not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="File not found")
 
-    return FileResponse(
-        path=file_path,
-        filename=filename,
-        media_type='application/json'
+    if not is_compressed(file_path):
+        return FileResponse(path=file_path, filename=filename, media_type='application/json')
+
+    if accepts_encoding(request.headers.get("accept-encoding", ""), "zstd"):
+        return FileResponse(
+            path=file_path,
+            filename=filename,
+            media_type='application/json',
+            headers={"Content-Encoding": "zstd", "Vary": "Accept-Encoding"}
+        )
+
+    return StreamingResponse(
+        iter_json_bytes(file_path),
+        media_type='application/json',
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
     )
 
 
@@ -251,44 +350,40 @@ def health_check() -> dict:
 
 
 @app.delete("/tasks/{task_id}", summary="Cancel analysis task")
-def cancel_task(task_id: str) -> dict:
+async def cancel_task(task_id: str) -> dict:
     """
     Cancel a running or queued analysis task.
     """
-    if task_id not in task_store:
+    task_status = await task_store.get(task_id)
+    if task_status is None:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    task_status = task_store[task_id]
-
     if task_status.status in ["completed", "failed"]:
         raise HTTPException(status_code=400, detail="Cannot cancel a completed or failed task")
 
-    task_status.status = "cancelled"
-    task_status.message = "Task cancelled by user"
-    task_status.updated_at = datetime.now()
+    await task_store.update(task_id, status="cancelled", message="Task cancelled by user")
 
     return {"message": "Task cancelled successfully"}
 
 
-def process_pdf_analysis(task_id: str, pdf_path: str, original_filename: str):
+async def process_pdf_analysis(task_id: str, pdf_path: str, original_filename: str):
     """
     Background task to process PDF analysis.
     """
-    task_status = task_store[task_id]
-
     try:
         # Update status to processing
-        task_status.status = "processing"
-        task_status.message = "Loading and analyzing document"
-        task_status.progress = 0.1
-        task_status.updated_at = datetime.now()
+        await task_store.update(
+            task_id,
+            status="processing",
+            message="Loading and analyzing document",
+            progress=0.1
+        )
 
-        # Create intermediate file name
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        intermediate_filename = f"intermediate_{timestamp}.json"
+        # Intermediate file named per task so concurrent analyses never share it
+        intermediate_filename = f"intermediate_{task_id}.json.zst"
 
         # Run analysis
-        result = orchestrate_compliance_analysis(pdf_path, intermediate_filename)
+        result = await aorchestrate_compliance_analysis(pdf_path, intermediate_filename)
 
         # Create final result structure
         analysis_result = AnalysisResult(
@@ -302,17 +397,18 @@ def process_pdf_analysis(task_id: str, pdf_path: str, original_filename: str):
         )
 
         # Save final results
-        final_filename = f"results_{task_id}.json"
-        with open(final_filename, 'w', encoding='utf-8') as f:
-            json.dump(serialize_for_json(analysis_result.model_dump()), f, indent=2, ensure_ascii=False, default=str)
+        final_filename = f"results_{task_id}.json.zst"
+        await asyncio.to_thread(write_results, analysis_result, final_filename)
 
         # Update task status
-        task_status.status = "completed"
-        task_status.progress = 1.0
-        task_status.message = f"Analysis completed. Found {len(result)} requirements."
-        task_status.result_path = final_filename
-        task_status.intermediate_path = intermediate_filename
-        task_status.updated_at = datetime.now()
+        await task_store.update(
+            task_id,
+            status="completed",
+            progress=1.0,
+            message=f"Analysis completed. Found {len(result)} requirements.",
+            result_path=final_filename,
+            intermediate_path=intermediate_filename
+        )
 
         # Clean up temp file
         if os.path.exists(pdf_path):
@@ -320,9 +416,7 @@ def process_pdf_analysis(task_id: str, pdf_path: str, original_filename: str):
 
     except Exception as e:
         # Update status on error
-        task_status.status = "failed"
-        task_status.message = f"Analysis failed: {str(e)}"
-        task_status.updated_at = datetime.now()
+        await task_store.update(task_id, status="failed", message=f"Analysis failed: {str(e)}")
 
         # Clean up files
         if os.path.exists(pdf_path):
@@ -9,6 +9,9 @@ class Settings(BaseSettings):
     # Ollama Configuration
     ollama_base_url: str = "https://ollama-serve.ascentbusiness.com"
     ollama_model: str = "mistral:latest"
+    ollama_keep_alive: str = "30m"  # How long Ollama keeps the model loaded between calls
+    ollama_num_parallel: int = 4  # Match the server's OLLAMA_NUM_PARALLEL
+    ollama_num_keep: int = 1024  # Prompt tokens kept in context; covers the static system prompt
 
     # Groq Configuration
     groq_api_key: Optional[str] = None
@@ -16,10 +19,25 @@ class Settings(BaseSettings):
 
     # Shared LLM Settings
     temperature: float = 0.1
+    llm_cache_path: Optional[str] = "llm_cache.db"  # SQLite response cache; empty disables
+    requests_per_minute: Optional[int] = None  # Provider rate limit; unlimited when unset
+    llm_max_attempts: int = 5  # Attempts per LLM call on rate limits and timeouts
 
     # Processing Configuration
-    max_workers: int = 6
-    chunk_overlap: int = 200
+    max_workers: int = 16  # Max concurrent in-flight LLM requests
+    control_batch_size: int = 8  # Requirements per control-suggestion call
+    chunk_overlap: int = 50  # Tokens shared between consecutive chunks
+    pdf_workers: Optional[int] = None  # PDF parsing processes per API worker (default: half the CPU cores split across API_WORKERS)
+
+    # API Server
+    api_host: str = "0.0.0.0"
+    api_port: int = 6333
+    api_workers: int = 1  # Use more than 1 only with redis_url set
+    api_reload: bool = False  # Development only
+    max_upload_mb: int = 200  # Larger uploads are rejected with 413
+
+    # Task Store
+    redis_url: Optional[str] = None  # e.g. redis://localhost:6379/0; in-memory when unset
 
     # Logging
     log_level: str = "INFO"
@@ -1,131 +1,341 @@
+import asyncio
+import bisect
+import functools
+import itertools
 import logging
+import multiprocessing
+import os
 import re
-from typing import List
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
 
-from langchain_community.document_loaders import PyPDFLoader
+import tiktoken
+from langchain_community.document_loaders import PyPDFium2Loader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 
 from .config import settings
 
 
-def detect_document_type(text_sample: str) -> str:
-    """Detect the compliance document type from sample text."""
-    text_lower = text_sample.lower()
-    if "iso" in text_lower or "international standard" in text_lower:
-        return "ISO"
-    elif "digital personal data protection" in text_lower or "data principal" in text_lower:
-        return "DPDP"
-    elif "rbi" in text_lower or "reserve bank" in text_lower:
-        return "RBI"
-    else:
-        return "GENERAL"
+# Tokenizer used to measure chunk sizes
+TOKEN_ENCODING = "cl100k_base"
 
+# Structured documents are chunked one logical section at a time; sections
+# above MAX_SECTION_TOKENS are resplit, those below MIN_SECTION_TOKENS
+# (headings, stray lines) are merged into the following section
+MAX_SECTION_TOKENS = 1100
+MIN_SECTION_TOKENS = 100
 
-def extract_document_name(text: str) -> str:
-    """Extract document/act name from text."""
-    import re
+# Precompiled patterns used on every document / chunk
+_SECTION_NUM_RE = re.compile(r'^([0-9]+(?:\.[0-9]+)*)')
+_NUM_PREFIX_RE = re.compile(r'^\d{1,3}\.')  # Clause numbers, not years like '2023.'
+_SEC_RE = re.compile(r'sec\.\s|sect', re.IGNORECASE)
+# Group names are the document types
+_DOC_TYPE_RE = re.compile(
+    r'(?P<ISO>iso|international standard)'
+    r'|(?P<DPDP>digital personal data protection|data principal)'
+    r'|(?P<RBI>rbi|reserve bank)',
+    re.IGNORECASE
+)
+_DOC_TYPE_PRIORITY = ("ISO", "DPDP", "RBI")
 
-    # Look for common patterns in compliance documents
-    patterns = [
+# Look for common patterns in compliance documents
+_NAME_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE) for pattern in (
         r'(?:Act|Bill|Standard|Regulation)(?:\s+(?:called|known|as|of))?\s*["\']?([^"\'\n]{10,80})(?:["\']|\.)',
         r'THE\s+([A-Z][^,\n]{10,80})(?:\s+ACT|\s+BILL)',
         r'INTERNATIONAL\s+STANDARD\s+([^,\n]{10,80})',
         r'(\b[A-Z][A-Z\s]+(?:ACT|BILL|STANDARD|REGULATION)[''"?]?\s*[^,\n]{0,50})',
-    ]
+    )
+]
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Page text clean-up applied once, before any other regex sees the text
+_TEXT_CLEANUP_TABLE = str.maketrans({
+    '\u00ad': None,   # Soft hyphen
+    '\u200b': None,   # Zero-width space
+    '\ufeff': None,   # Byte order mark
+    '\r': None,       # PDFium emits CRLF line endings
+    '\t': ' ',
+})
+_SPACE_RUN_RE = re.compile(r' {2,}')
+_TRAILING_SPACE_RE = re.compile(r' +$', re.MULTILINE)
+
+# Lines that start a new logical section, per structured document type. The
+# "num" group captures the clause number, which becomes the section ID;
+# headings without one (chapters, annexes) use the matched text instead
+_SECTION_HEADING_RES = {
+    # "4. (1) A person...", "SEC. 4. ...", "CHAPTER II"; the clause number must be
+    # followed by a dot so the "SEC. 1] THE GAZETTE..." page header never matches
+    "DPDP": re.compile(
+        r'^ *(?:CHAPTER\s+[IVXLC]+\b|(?:(?:SEC\.|Section)\s*)?(?P<num>\d{1,3})\.\s+(?:\(\s*\d+\s*\)\s*)?[A-Z])',
+        re.MULTILINE
+    ),
+    "ISO": re.compile(r'^(?:(?P<num>\d{1,2}(?:\.\d{1,2}){0,3})\s+[A-Z]|Annex\s+[A-Z]\b|Bibliography\b)', re.MULTILINE),
+    "RBI": re.compile(r'^(?:(?P<num>\d{1,3}(?:\.\d{1,2})*)\.?\s+[A-Z(]|(?:Chapter|Annexure)\s+[IVXLC\d]+\b)', re.MULTILINE),
+}
+
+# Running page headers/footers removed before section splitting
+_RUNNING_HEADER_RES = {
+    # "SEC. 1] THE GAZETTE OF INDIA EXTRAORDINARY 3" / "2 THE GAZETTE OF INDIA EXTRAORDINARY [PART II—"
+    "DPDP": re.compile(r'^.*\bTHE GAZETTE OF INDIA EXTRAORDINARY\b.*\n?', re.MULTILINE),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def get_token_encoding() -> tiktoken.Encoding:
+    """Return the tokenizer used to measure chunk sizes (loaded once per process)."""
+    return tiktoken.get_encoding(TOKEN_ENCODING)
+
 
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+def token_len(text: str) -> int:
+    """Return the number of tokens in text."""
+    return len(get_token_encoding().encode(text, disallowed_special=()))
+
+
+def normalize_text(text: str) -> str:
+    """Normalize extracted PDF text: NFKC (ligatures, odd spaces), invisible characters, runs of spaces."""
+    text = unicodedata.normalize('NFKC', text).translate(_TEXT_CLEANUP_TABLE)
+    return _TRAILING_SPACE_RE.sub('', _SPACE_RUN_RE.sub(' ', text))
+
+
+def normalized_pages(pages: Iterator[Document]) -> Iterator[Document]:
+    """Normalize each page's text as it is loaded."""
+    for page in pages:
+        page.page_content = normalize_text(page.page_content)
+        yield page
+
+
+def detect_document_type(text_sample: str) -> str:
+    """Detect the compliance document type from sample text."""
+    # Single scan collecting every matched type, then resolve by priority
+    found = set()
+    for match in _DOC_TYPE_RE.finditer(text_sample):
+        found.add(match.lastgroup)
+        if "ISO" in found:
+            break
+
+    for doc_type in _DOC_TYPE_PRIORITY:
+        if doc_type in found:
+            return doc_type
+    return "GENERAL"
+
+
+def extract_document_name(text: str) -> str:
+    """Extract document/act name from text."""
+    for pattern in _NAME_PATTERNS:
+        match = pattern.search(text)
         if match:
             name = match.group(1).strip()
             # Clean up common artifacts
-            name = re.sub(r'\s+', ' ', name)
+            name = _WHITESPACE_RE.sub(' ', name)
             if len(name) > 10 and len(name) < 100:
                 return name
 
     return "Compliance Document"  # Default fallback
 
 
+def detect_section_id(first_line: str, index: int, doc_type: str) -> str:
+    """Derive a chunk's section ID from its first line."""
+    if doc_type == "DPDP" and _SEC_RE.search(first_line):
+        return f"Section_{index+1}"
+    elif _NUM_PREFIX_RE.match(first_line) or first_line.isdigit() or "ANNEX" in first_line.upper():
+        return first_line
+    return f"section_{index+1}"
+
+
+def join_pages(pages: Iterator[Document]) -> Tuple[str, List[int], List[dict]]:
+    """Join page texts with newlines, keeping each page's start offset and metadata."""
+    texts, page_starts, page_metadata = [], [], []
+    offset = 0
+    for page in pages:
+        texts.append(page.page_content)
+        page_starts.append(offset)
+        page_metadata.append(page.metadata)
+        offset += len(page.page_content) + 1  # Joining newline
+    return "\n".join(texts), page_starts, page_metadata
+
+
+def strip_running_headers(pages: Iterator[Document], header_re: re.Pattern) -> Iterator[Document]:
+    """Remove running page header/footer lines from each page."""
+    for page in pages:
+        page.page_content = header_re.sub('', page.page_content)
+        yield page
+
+
+def split_sections(text: str, heading_re: re.Pattern) -> List[Tuple[int, Optional[str], str]]:
+    """Split text at every heading line into (start offset, heading ID, section text) triples.
+
+    The heading ID is the clause number the heading regex captured, or the
+    heading itself when it has none. Text before the first heading is kept
+    as its own section, with no heading ID.
+    """
+    headings = [
+        (match.start(), match.group('num') or match.group(0).strip())
+        for match in heading_re.finditer(text)
+    ]
+    if not headings or headings[0][0] != 0:
+        headings.insert(0, (0, None))
+    ends = [start for start, _ in headings[1:]] + [len(text)]
+    sections = ((start, heading_id, text[start:end].strip()) for (start, heading_id), end in zip(headings, ends))
+    return [(start, heading_id, section) for start, heading_id, section in sections if section]
+
+
+def chunk_by_sections(text: str, page_starts: List[int], page_metadata: List[dict], heading_re: re.Pattern,
+                      text_splitter: RecursiveCharacterTextSplitter, doc_type: str) -> List[Document]:
+    """Build one chunk per logical section, resplitting oversized and merging tiny sections.
+
+    Each chunk carries the metadata (source, page) of the page its section starts on.
+    """
+    chunks = []
+    carry = ""  # Tiny sections waiting to be prefixed to the next one
+    carry_start = 0
+    carry_id = ""
+    for start, heading_id, section in split_sections(text, heading_re):
+        # Section ID comes from the section's own heading, not from merged-in text
+        section_id = heading_id or detect_section_id(section.split('\n', 1)[0].strip(), len(chunks), doc_type)
+        if carry:
+            section = carry + "\n" + section
+            start = carry_start
+        tokens = token_len(section)
+        if tokens < MIN_SECTION_TOKENS:
+            carry, carry_start, carry_id = section, start, section_id
+            continue
+        carry = ""
+
+        metadata = {
+            **page_metadata[bisect.bisect_right(page_starts, start) - 1],
+            'section_id': section_id
+        }
+        pieces = text_splitter.split_text(section) if tokens > MAX_SECTION_TOKENS else [section]
+        chunks.extend(Document(page_content=piece, metadata=dict(metadata)) for piece in pieces)
+
+    if carry:
+        if chunks:
+            # Trailing tiny sections join the last chunk, which must stay within the limit
+            last = chunks.pop()
+            merged = last.page_content + "\n" + carry
+            pieces = text_splitter.split_text(merged) if token_len(merged) > MAX_SECTION_TOKENS else [merged]
+            chunks.extend(Document(page_content=piece, metadata=dict(last.metadata)) for piece in pieces)
+        else:
+            chunks.append(Document(page_content=carry, metadata={
+                **page_metadata[bisect.bisect_right(page_starts, carry_start) - 1],
+                'section_id': carry_id
+            }))
+    return chunks
+
+
 def load_and_chunk_pdf(pdf_path: str) -> tuple[str, str, List[Document]]:
     """Load PDF and split into logical chunks based on document type."""
-    loader = PyPDFLoader(pdf_path)
-    documents = loader.load()
+    loader = PyPDFium2Loader(pdf_path)  # PDFium (C++) text extraction
+    pages = normalized_pages(loader.lazy_load())  # One page at a time instead of the whole PDF
 
-    # Get sample text for document type detection
-    sample_text = documents[0].page_content[:2000] if documents else ""
+    # Get sample text for document type detection from the first page
+    first_page = next(pages, None)
+    sample_text = first_page.page_content[:2000] if first_page else ""
     doc_type = detect_document_type(sample_text)
     doc_name = extract_document_name(sample_text)
 
-    # Base separators
+    # Base separators (regexes, see is_separator_regex below)
     separators = [
-        "\n\n", "\n", " "  # Fallbacks
+        r"\n\n", r"\n", r" "  # Fallbacks
     ]
 
     # Document-specific chunking strategy
     if doc_type == "DPDP":
         # DPDP chunking: Use large chunks with natural breaks to avoid over-fragmentation
         separators = [
-            "\nCHAPTER ", "\nChapter ",     # Major chapter divisions only
-            "\nAnnex ", "\nBibliography ",  # End matter breaks
-            "\nAppendix "                   # Appendix breaks
+            r"\n(?:CHAPTER|Chapter)\s",                 # Major chapter divisions only
+            r"\n(?:Annex|Bibliography|Appendix)\s"      # End matter breaks
             # REMOVED: Individual section numbers to prevent over-splitting
         ] + separators
-        chunk_size = 3500  # Larger chunks to group related sections
+        chunk_size = 875  # Larger chunks to group related sections
     elif doc_type == "ISO":
         # ISO standards have systematic numbering with subsections
         separators = [
-            "\n\d+\.\d+\.\d+ ", "\n\d+\.\d+ ", "\n\d+\. ",  # Subdivision priority
-            "\nAnnex ", "\nBibliography ", "\nNormative references ",
-            "\n## ", "\n# "
+            r"\n\d+\.\d+\.\d+\s", r"\n\d+\.\d+\s", r"\n\d+\.\s",  # Subdivision priority
+            r"\n(?:Annex|Bibliography|Normative references)\s",
+            r"\n#{1,2} "
         ] + separators
-        chunk_size = 2500  # Larger sections
+        chunk_size = 625  # Larger sections
     elif doc_type == "RBI":
         separators = [
-            "\n\d+\. ", "\n\d+\.\d+ ", "\nChapter ", "\nAnnexure ",
-            "\nRegulation ", "\nGuideline "
+            r"\n\d+\.\s", r"\n\d+\.\d+\s",
+            r"\n(?:Chapter|Annexure|Regulation|Guideline)\s"
         ] + separators
-        chunk_size = 2200
+        chunk_size = 550
     else:
         # General compliance documents
         separators = [
-            "\n\d+\. ", "\n\d+\.\d+ ", "\nChapter ", "\nSection ", "\nArticle ",
-            "\nClause ", "\nANNEX ", "\nAppendix "
+            r"\n\d+\.\s", r"\n\d+\.\d+\s",
+            r"\n(?:Chapter|Section|Article|Clause|ANNEX|Appendix)\s"
         ] + separators
-        chunk_size = 2000
+        chunk_size = 500
 
-    logging.info(f"Detected document type: {doc_type}, using {len(separators)} separators, chunk_size={chunk_size}")
+    logging.info(f"Detected document type: {doc_type}, using {len(separators)} separators, chunk_size={chunk_size} tokens")
 
-    text_splitter = RecursiveCharacterTextSplitter(
+    # Chunk sizes are in tokens of the encoding below, so chunks map
+    # directly onto the LLM context instead of through a character proxy
+    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        encoding_name=TOKEN_ENCODING,
+        disallowed_special=(),  # Count special-token strings as text, like token_len
         chunk_size=chunk_size,
         chunk_overlap=settings.chunk_overlap,  # Consistent overlap
-        separators=separators
+        separators=separators,
+        is_separator_regex=True
     )
 
-    chunks = text_splitter.split_documents(documents)
+    chunks = []
+    if first_page and doc_type in _SECTION_HEADING_RES:
+        # Sections span pages, so structured documents are chunked on the joined text
+        structured_pages = itertools.chain([first_page], pages)
+        if doc_type in _RUNNING_HEADER_RES:
+            structured_pages = strip_running_headers(structured_pages, _RUNNING_HEADER_RES[doc_type])
+        text, page_starts, page_metadata = join_pages(structured_pages)
+        chunks = chunk_by_sections(text, page_starts, page_metadata, _SECTION_HEADING_RES[doc_type], text_splitter, doc_type)
+    elif first_page:
+        # Pages are split independently, so each page can be dropped once chunked
+        for page in itertools.chain([first_page], pages):
+            chunks.extend(text_splitter.split_documents([page]))
+
+        # Add section IDs based on content
+        for i, chunk in enumerate(chunks):
+            chunk.metadata['section_id'] = detect_section_id(chunk.page_content.split('\n', 1)[0].strip(), i, doc_type)
     logging.info(f"Split into {len(chunks)} chunks")
 
-    # Add section IDs based on content
-    for i, chunk in enumerate(chunks):
-        lines = chunk.page_content.split('\n')
-        if lines:
-            first_line = lines[0].strip()
-            # More sophisticated section ID detection
-            section_id = None
-            if doc_type == "DPDP" and any(f"sect" in first_line.lower() or f"sec. " in first_line for f in ["SEC", "Sect"]):
-                section_id = f"Section_{i+1}"
-            elif any(first_line.startswith(f"{j}.") for j in range(1, 50)) or first_line.isdigit() or "ANNEX" in first_line.upper():
-                section_id = first_line
-            else:
-                section_id = f"section_{i+1}"
-
-            chunk.metadata.update({'section_id': section_id, 'doc_type': doc_type})
-        else:
-            chunk.metadata.update({'section_id': f"section_{i+1}", 'doc_type': doc_type})
+    for chunk in chunks:
+        chunk.metadata['doc_type'] = doc_type
 
     return doc_type, doc_name, chunks
 
 
+@functools.lru_cache(maxsize=None)
+def get_pdf_pool() -> ProcessPoolExecutor:
+    """Return the process pool used for CPU-bound PDF parsing (created on first use).
+
+    Workers are started with forkserver (spawn where unavailable): forking the
+    API process would copy the event loop, httpx client and executor threads
+    mid-flight. Each API worker owns a pool, so the default splits half the
+    cores between them.
+    """
+    max_workers = settings.pdf_workers or max(1, (os.cpu_count() or 2) // (2 * max(1, settings.api_workers)))
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(start_method))
+
+
+async def aload_and_chunk_pdf(pdf_path: str) -> tuple[str, str, List[Document]]:
+    """Load and chunk a PDF in the process pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_pdf_pool(), load_and_chunk_pdf, pdf_path)
+
+
+def load_and_chunk_pdfs(pdf_paths: List[str]) -> List[tuple[str, str, List[Document]]]:
+    """Load and chunk several PDFs in parallel across processes."""
+    return list(get_pdf_pool().map(load_and_chunk_pdf, pdf_paths))
+
+
 def extract_section_num(section_id: str) -> str:
     """Extract the section number from section_id, e.g., '6.1.2 Determining...' -> '6.1.2'"""
-    match = re.search(r'^([0-9]+(?:\.[0-9]+)*)', section_id)
+    match = _SECTION_NUM_RE.match(section_id)
     return match.group(1) if match else None
@@ -1,220 +1,623 @@
+import asyncio
+import contextlib
+import hashlib
 import logging
-import concurrent.futures
-from typing import List, Dict, Any, Tuple
-import json
+import functools
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple
 from datetime import datetime
 
+import httpx
+import orjson
 from langchain_core.documents import Document
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.exceptions import OutputParserException
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.outputs import Generation
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel, TypeAdapter, ValidationError
 
 from .config import settings
 from .document_loader import extract_section_num
-from .models import ComplianceRequirement
+from .storage import ZSTD_SUFFIX, write_json
+from .models import ComplianceRequirement, RequirementList, ControlList, BatchedControlList
 
+if TYPE_CHECKING:
+    from aiolimiter import AsyncLimiter
 
-def create_llm():
-    """Create configured LLM instance based on provider setting."""
+
+@functools.lru_cache(maxsize=None)
+def configure_llm_cache() -> None:
+    """Enable the exact-match LLM response cache (once per process)."""
+    if not settings.llm_cache_path:
+        return
+
+    from langchain_core.globals import set_llm_cache
+    from langchain_community.cache import SQLiteCache
+
+    # Keyed on the full rendered prompt + model params, so a repeated
+    # chunk or requirement skips the network call entirely
+    set_llm_cache(SQLiteCache(database_path=settings.llm_cache_path))
+    logging.info(f"LLM response cache enabled at {settings.llm_cache_path}")
+
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+
+# Validates a whole result list at once
+_REQUIREMENT_LIST_ADAPTER = TypeAdapter(List[ComplianceRequirement])
+
+# Controls suggested for recently seen requirements, keyed by requirement_key
+CONTROL_CACHE_SIZE = 4096
+_CONTROL_CACHE: "OrderedDict[bytes, List[Dict[str, Any]]]" = OrderedDict()
+
+# Minimum time between checkpoint flushes to disk
+CHECKPOINT_INTERVAL_SECONDS = 2.0
+
+# Connection pool shared by all in-flight LLM requests (HTTP keep-alive)
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=64, max_connections=128)
+
+
+# Async clients bind their connection pools to the event loop they are first
+# used on, so everything holding one is cached per running loop rather than
+# per process; a later asyncio.run() gets fresh instances
+_LOOP_RESOURCES: Dict[asyncio.AbstractEventLoop, Dict[str, Any]] = {}
+
+
+def loop_cached(build):
+    """Cache build()'s result for the running event loop."""
+    @functools.wraps(build)
+    def wrapper():
+        loop = asyncio.get_running_loop()
+        if loop not in _LOOP_RESOURCES:
+            # Drop resources of loops closed since (e.g. by an earlier asyncio.run)
+            for closed_loop in [other for other in _LOOP_RESOURCES if other.is_closed()]:
+                del _LOOP_RESOURCES[closed_loop]
+            _LOOP_RESOURCES[loop] = {}
+        resources = _LOOP_RESOURCES[loop]
+        if build.__name__ not in resources:
+            resources[build.__name__] = build()
+        return resources[build.__name__]
+    return wrapper
+
+
+@loop_cached
+def get_async_http_client() -> httpx.AsyncClient:
+    """Return the async HTTP client used for LLM calls on the running loop."""
+    return httpx.AsyncClient(limits=HTTP_LIMITS, timeout=httpx.Timeout(120.0))
+
+
+@loop_cached
+def get_llm_semaphore() -> asyncio.Semaphore:
+    """Return the semaphore bounding in-flight LLM requests across all analyses on the running loop."""
+    return asyncio.Semaphore(get_llm_concurrency())
+
+
+@loop_cached
+def get_rate_limiter() -> Optional["AsyncLimiter"]:
+    """Return the requests-per-minute limiter for the running loop, or None if unlimited."""
+    if not settings.requests_per_minute:
+        return None
+
+    from aiolimiter import AsyncLimiter
+    return AsyncLimiter(settings.requests_per_minute, 60)
+
+
+class LLMOverloadedError(Exception):
+    """The provider answered that it is overloaded (e.g. Ollama 429/503); worth retrying."""
+
+
+# HTTP statuses Ollama uses for "too many requests" / "server busy"
+OLLAMA_OVERLOAD_STATUSES = (429, 503)
+
+
+def as_retryable(error: Exception) -> Exception:
+    """Map provider overload errors that carry no dedicated type onto LLMOverloadedError."""
+    if settings.llm_provider == "ollama":
+        import ollama
+        if isinstance(error, ollama.ResponseError) and error.status_code in OLLAMA_OVERLOAD_STATUSES:
+            overloaded = LLMOverloadedError(str(error))
+            overloaded.__cause__ = error
+            return overloaded
+    return error
+
+
+def get_retryable_exceptions() -> Tuple[type[BaseException], ...]:
+    """Return the transient errors (rate limits, timeouts) worth retrying for the provider."""
+    if settings.llm_provider == "groq":
+        import groq
+        return (groq.RateLimitError, groq.APITimeoutError, groq.APIConnectionError, TimeoutError)
+    return (LLMOverloadedError, httpx.TimeoutException, httpx.ConnectError, TimeoutError)
+
+
+def create_llm(http_async_client: Optional[httpx.AsyncClient] = None):
+    """Create configured LLM instance based on provider setting.
+
+    http_async_client is the pooled client Groq should use for async calls;
+    without one the SDK creates its own.
+    """
     settings.validate_llm_provider()
+    configure_llm_cache()
 
     if settings.llm_provider == "groq":
         from langchain_groq import ChatGroq
         return ChatGroq(
             model=settings.groq_model,
             api_key=settings.groq_api_key,
-            temperature=settings.temperature
+            temperature=settings.temperature,
+            http_async_client=http_async_client
         )
     else:  # ollama
-        from langchain_ollama import OllamaLLM
-        return OllamaLLM(
+        # Chat model, so the system/human split reaches the model's chat template
+        from langchain_ollama import ChatOllama
+        llm = ChatOllama(
             model=settings.ollama_model,
             base_url=settings.ollama_base_url,
-            temperature=settings.temperature
+            temperature=settings.temperature,
+            keep_alive=settings.ollama_keep_alive,  # Keep model (and cached prompt prefix) loaded
+            format="json",  # Constrain output to valid JSON
+            client_kwargs={"limits": HTTP_LIMITS}
         )
+        # num_keep has no ChatOllama field; explicit options replace the
+        # field-derived ones, so temperature is repeated here
+        return llm.bind(options={
+            "temperature": settings.temperature,
+            "num_keep": settings.ollama_num_keep,  # Static system prefix survives context shifts
+        })
 
 
-def create_requirement_chain(llm, doc_name: str):
-    """Create the requirement extraction chain."""
-    req_prompt = PromptTemplate(
-        template="""
-        You are analyzing the "{doc_name}" compliance document.
-        Below is text from document Section {section_number}:
-
-        Section {section_number}: {text}
-
-        IMPORTANT: Identify ONLY enforceable COMPLIANCE REQUIREMENTS that organizations MUST follow.
-        Requirements are MANDATORY obligations containing enforcement language like:
-        - "shall" / "must" / "will" / "is required to"
-        - "shall not" / "must not" / "will not"
-        - Specific mandates, prohibitions, or mandatory procedures
-
-        DO NOT include:
-        - Act titles, names, or introductory statements ("This Act shall be called...")
-        - Section headers, chapter titles, or numbering
-        - Definitions or explanatory text without enforcement language
-        - Historical context or procedural descriptions
-        - Permissions, allowances, or discretionary language ("may", "can", "could")
-        - General principles without specific mandates
-
-        EXAMPLES of ENFORCEABLE REQUIREMENTS:
-        ✓ "Organizations shall implement access controls..."
-        ✓ "Personal data shall not be processed without consent..."
-        ✓ "The organization shall conduct risk assessments..."
-
-        EXAMPLES to EXCLUDE:
-        ✗ "The Act may be called..." (title/name)
-        ✗ "This section covers..." (introduction)
-        ✗ "Data fiduciary means..." (definition without mandate)
-        ✗ "For the purposes of..." (context without obligation)
-
-        If NO enforceable requirements exist in this text, return an empty array [].
-
-        For each REQUIREMENT found, provide detailed information:
-
-        Output a JSON array where each requirement has:
-        - requirement_title: A descriptive title for the requirement
-        - article_number: Use the section number provided: "{section_number}"
-        - priority: "high" for core compliance mandates, "medium" for procedural requirements, "low" for administrative items
-        - article_text: The text content from this section
-        - requirement: The concise requirement statement (the specific mandate)
-        - requirement_description: A brief description of what the requirement means
-
-        Requirements in this section (JSON array, empty [] if none found):
-        """,
-        input_variables=["doc_name", "section_number", "text"]
+# Static instructions live in the system message so every call shares an
+# identical prompt prefix; per-chunk content goes last in the human message.
+# This lets the provider reuse the cached prefix instead of re-prefilling it.
+REQUIREMENT_SYSTEM_PROMPT = """
+You are analyzing compliance documents to extract enforceable requirements.
+Each message gives you the document name and the text of one document section.
+
+IMPORTANT: Identify ONLY enforceable COMPLIANCE REQUIREMENTS that organizations MUST follow.
+Requirements are MANDATORY obligations containing enforcement language like:
+- "shall" / "must" / "will" / "is required to"
+- "shall not" / "must not" / "will not"
+- Specific mandates, prohibitions, or mandatory procedures
+
+DO NOT include:
+- Act titles, names, or introductory statements ("This Act shall be called...")
+- Section headers, chapter titles, or numbering
+- Definitions or explanatory text without enforcement language
+- Historical context or procedural descriptions
+- Permissions, allowances, or discretionary language ("may", "can", "could")
+- General principles without specific mandates
+
+EXAMPLES of ENFORCEABLE REQUIREMENTS:
+✓ "Organizations shall implement access controls..."
+✓ "Personal data shall not be processed without consent..."
+✓ "The organization shall conduct risk assessments..."
+
+EXAMPLES to EXCLUDE:
+✗ "The Act may be called..." (title/name)
+✗ "This section covers..." (introduction)
+✗ "Data fiduciary means..." (definition without mandate)
+✗ "For the purposes of..." (context without obligation)
+
+For each requirement, also suggest appropriate controls.
+Each control should have priority ("high", "medium", or "low"), control_title, and a detailed control description.
+
+If NO enforceable requirements exist in the text, return an empty list of requirements.
+"""
+
+REQUIREMENT_HUMAN_PROMPT = """Document: "{doc_name}"
+
+Section {section_number}: {text}"""
+
+CONTROL_SYSTEM_PROMPT = """
+For the given compliance requirement, suggest appropriate controls.
+Each control should have priority ("high", "medium", or "low"), control_title, and a detailed control description.
+"""
+
+CONTROL_HUMAN_PROMPT = "Requirement: {requirement}"
+
+BATCHED_CONTROL_SYSTEM_PROMPT = """
+For each compliance requirement in the numbered list, suggest appropriate controls.
+Each control should have priority ("high", "medium", or "low"), control_title, and a detailed control description.
+Return exactly one result per requirement, in the same order as the list.
+"""
+
+BATCHED_CONTROL_HUMAN_PROMPT = """Requirements:
+{requirements}"""
+
+
+class OrjsonPydanticOutputParser(PydanticOutputParser):
+    """PydanticOutputParser that decodes plain JSON replies with orjson."""
+
+    def parse_result(self, result: List[Generation], *, partial: bool = False) -> Any:
+        try:
+            obj = orjson.loads(result[0].text)
+        except orjson.JSONDecodeError:
+            # Fenced or otherwise wrapped JSON; let the stock parser dig it out
+            return super().parse_result(result, partial=partial)
+
+        try:
+            return self.pydantic_object.model_validate(obj)
+        except ValidationError as e:
+            if partial:
+                return None
+            raise OutputParserException(
+                f"Failed to parse {self.pydantic_object.__name__} from completion {result[0].text}. Got: {e}",
+                llm_output=result[0].text
+            ) from e
+
+
+def create_structured_chain(llm, system_prompt: str, human_prompt: str, schema: type[BaseModel],
+                            rate_limiter=None, semaphore: Optional[asyncio.Semaphore] = None):
+    """Create a chain whose output is an instance of schema, using the provider's structured output."""
+    if settings.llm_provider == "groq":
+        # Native tool/function calling; the schema travels with the request
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", system_prompt),
+            ("human", human_prompt),
+        ])
+        return with_rate_limit_and_retry(prompt | llm.with_structured_output(schema), rate_limiter, semaphore)
+
+    # Ollama runs in JSON mode; the schema is spelled out once in the static system prefix
+    parser = OrjsonPydanticOutputParser(pydantic_object=schema)
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", system_prompt + "\n{format_instructions}"),
+        ("human", human_prompt),
+    ]).partial(format_instructions=parser.get_format_instructions())
+    return with_rate_limit_and_retry(prompt | llm | parser, rate_limiter, semaphore)
+
+
+def with_rate_limit_and_retry(chain, rate_limiter=None, semaphore: Optional[asyncio.Semaphore] = None):
+    """Gate each call of chain on semaphore and rate_limiter (if given) and retry transient failures with backoff.
+
+    Every attempt, including retries, holds a semaphore slot and waits for
+    the limiter, so the in-flight cap and the configured requests per
+    minute hold even while recovering from 429s; backoff sleeps release
+    the slot. Provider overload errors are mapped through as_retryable
+    so they are retried like rate limits.
+    """
+    inner = chain
+
+    def call(value, config):
+        try:
+            return inner.invoke(value, config)
+        except Exception as e:
+            raise as_retryable(e)
+
+    async def gated(value, config):
+        async with semaphore or contextlib.nullcontext():
+            if rate_limiter is not None:
+                await rate_limiter.acquire()
+            try:
+                return await inner.ainvoke(value, config)
+            except Exception as e:
+                raise as_retryable(e)
+
+    chain = RunnableLambda(call, afunc=gated)
+
+    return chain.with_retry(
+        retry_if_exception_type=get_retryable_exceptions(),
+        wait_exponential_jitter=True,
+        stop_after_attempt=settings.llm_max_attempts,
     )
 
-    return req_prompt | llm | JsonOutputParser()
+
+def create_requirement_chain(llm, rate_limiter=None, semaphore: Optional[asyncio.Semaphore] = None):
+    """Create the requirement extraction chain."""
+    return create_structured_chain(llm, REQUIREMENT_SYSTEM_PROMPT, REQUIREMENT_HUMAN_PROMPT, RequirementList,
+                                   rate_limiter, semaphore)
 
 
-def create_control_chain(llm):
+def create_control_chain(llm, rate_limiter=None, semaphore: Optional[asyncio.Semaphore] = None):
     """Create the control suggestion chain."""
-    ctrl_prompt = PromptTemplate(
-        template="""
-        For the following compliance requirement, suggest appropriate controls in JSON format.
-        Each control should have priority, control_title, and control description.
+    return create_structured_chain(llm, CONTROL_SYSTEM_PROMPT, CONTROL_HUMAN_PROMPT, ControlList,
+                                   rate_limiter, semaphore)
 
-        Requirement: {requirement}
 
-        Output a JSON array where each item has:
-        - priority: "high", "medium", or "low"
-        - control_title: A descriptive title for the control
-        - control: Detailed control description
+def create_batched_control_chain(llm, rate_limiter=None, semaphore: Optional[asyncio.Semaphore] = None):
+    """Create the chain suggesting controls for several requirements in one call."""
+    return create_structured_chain(llm, BATCHED_CONTROL_SYSTEM_PROMPT, BATCHED_CONTROL_HUMAN_PROMPT, BatchedControlList,
+                                   rate_limiter, semaphore)
 
-        Suggested Controls (JSON array):
-        """,
-        input_variables=["requirement"]
-    )
 
-    return ctrl_prompt | llm | JsonOutputParser()
+def get_llm_concurrency() -> int:
+    """Return how many LLM requests to keep in flight for the configured provider."""
+    if settings.llm_provider == "ollama":
+        # Ollama only runs num_parallel requests at once; anything beyond that
+        # just queues server-side and eats into the client timeout
+        return max(1, min(settings.max_workers, settings.ollama_num_parallel))
+    return settings.max_workers
 
 
-def extract_requirements_from_chunk(req_chain, chunk: Document, doc_name: str) -> List[Dict[str, Any]]:
-    """Extract requirements from a single chunk."""
-    section_id = chunk.metadata.get('section_id', 'unknown')
-    section_num = extract_section_num(section_id) or section_id
+# The create_* factories are plain sync functions; these getters, called from
+# the async path, bind the loop-bound client and limiter and cache the result
+# per event loop (normally the API worker's single loop)
+@loop_cached
+def get_llm():
+    """Return the shared LLM instance for the running loop."""
+    return create_llm(http_async_client=get_async_http_client())
 
-    try:
-        raw_output = req_chain.invoke({
-            "doc_name": doc_name,
-            "section_number": section_num,
-            "text": chunk.page_content
-        })
-        # raw_output is already the parsed JSON list
-        if isinstance(raw_output, list):
-            # Override article_number and set article_text for each req
-            for req in raw_output:
-                req['article_number'] = section_num
-                req['article_text'] = chunk.page_content
-            return raw_output
-        logging.warning(f"Requirement extraction returned non-list for chunk {section_id}")
-        return []
-    except Exception as e:
-        logging.error(f"Error extracting requirements from chunk {section_id}: {str(e)}")
-        return []
 
+@loop_cached
+def get_req_chain():
+    """Return the shared requirement extraction chain for the running loop."""
+    return create_requirement_chain(get_llm(), rate_limiter=get_rate_limiter(), semaphore=get_llm_semaphore())
 
-def extract_controls_for_requirement(ctrl_chain, requirement_dict: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Extract control suggestions for a single requirement."""
-    try:
-        raw_output = ctrl_chain.invoke({"requirement": requirement_dict.get("requirement", "")})
-        # raw_output is already the parsed JSON list
-        if isinstance(raw_output, list):
-            return raw_output
-        logging.warning(f"Control extraction returned non-list for requirement: {requirement_dict.get('requirement', '')[:50]}...")
+
+@loop_cached
+def get_ctrl_chain():
+    """Return the shared control suggestion chain for the running loop."""
+    return create_control_chain(get_llm(), rate_limiter=get_rate_limiter(), semaphore=get_llm_semaphore())
+
+
+@loop_cached
+def get_batched_ctrl_chain():
+    """Return the shared batched control suggestion chain for the running loop."""
+    return create_batched_control_chain(get_llm(), rate_limiter=get_rate_limiter(), semaphore=get_llm_semaphore())
+
+
+def requirement_input(chunk: Document, doc_name: str) -> Dict[str, str]:
+    """Build the requirement chain input for a chunk."""
+    section_id = chunk.metadata.get('section_id', 'unknown')
+    return {
+        "doc_name": doc_name,
+        "section_number": extract_section_num(section_id) or section_id,
+        "text": chunk.page_content
+    }
+
+
+def requirements_from_output(chunk_idx: int, req_input: Dict[str, str], raw_output: Any) -> List[Dict[str, Any]]:
+    """Turn a requirement chain output (or the exception it raised) into requirement dicts.
+
+    Requirements carry an article_text_ref (the chunk index as a string, so
+    it matches the JSON object keys of article_texts) instead of the chunk
+    text; the text is attached only when the models are validated.
+    """
+    if isinstance(raw_output, Exception):
+        logging.error(f"Error extracting requirements from chunk {chunk_idx+1} (section {req_input['section_number']}): {str(raw_output)}")
         return []
-    except Exception as e:
-        logging.error(f"Error extracting controls: {str(e)}")
+
+    # Set article_number and article_text reference for each req from the chunk
+    requirements = [req.model_dump() for req in raw_output.requirements]
+    for req in requirements:
+        req['article_number'] = req_input["section_number"]
+        req['article_text_ref'] = str(chunk_idx)
+    return requirements
+
+
+def controls_from_output(raw_output: Any) -> List[Dict[str, Any]]:
+    """Turn a control chain output (or the exception it raised) into control dicts."""
+    if isinstance(raw_output, Exception):
+        logging.error(f"Error extracting controls: {str(raw_output)}")
         return []
+    return [control.model_dump() for control in raw_output.controls]
+
+
+async def suggest_controls(requirements: List[Dict[str, Any]], batched_ctrl_chain,
+                           ctrl_chain) -> List[List[Dict[str, Any]]]:
+    """Suggest controls for requirements, several requirements per LLM call.
+
+    Batches whose output does not line up with their requirements fall back
+    to one call per requirement.
+    """
+    batch_size = settings.control_batch_size
+    batches = [requirements[i:i + batch_size] for i in range(0, len(requirements), batch_size)]
+    batch_inputs = [
+        {"requirements": "\n".join(f"{n}. {req.get('requirement', '')}" for n, req in enumerate(batch, 1))}
+        for batch in batches
+    ]
+    batch_outputs = await batched_ctrl_chain.abatch(batch_inputs, return_exceptions=True)
+
+    all_controls: List[Optional[List[Dict[str, Any]]]] = []
+    for batch, raw_output in zip(batches, batch_outputs):
+        if isinstance(raw_output, Exception):
+            logging.error(f"Error extracting batched controls: {str(raw_output)}")
+            all_controls.extend([None] * len(batch))
+        elif len(raw_output.results) != len(batch):
+            # Expect one list of controls per requirement, in order
+            logging.warning(f"Batched control extraction returned mismatched output for {len(batch)} requirements, "
+                            f"falling back to per-requirement calls")
+            all_controls.extend([None] * len(batch))
+        else:
+            all_controls.extend([control.model_dump() for control in result.controls] for result in raw_output.results)
+
+    # Retry requirements from failed batches one at a time
+    retry = [i for i, controls in enumerate(all_controls) if controls is None]
+    if retry:
+        retry_outputs = await ctrl_chain.abatch(
+            [{"requirement": requirements[i].get("requirement", "")} for i in retry],
+            return_exceptions=True
+        )
+        for i, raw_output in zip(retry, retry_outputs):
+            all_controls[i] = controls_from_output(raw_output)
 
+    return all_controls
+
+
+def normalize_requirement(text: str) -> str:
+    """Normalize requirement text for duplicate detection (case, punctuation, whitespace)."""
+    return " ".join(_PUNCTUATION_RE.sub("", text.lower()).split())
+
+
+def requirement_key(text: str) -> bytes:
+    """Return a compact hash identifying a normalized requirement."""
+    return hashlib.blake2b(normalize_requirement(text).encode(), digest_size=16).digest()
 
-def process_chunk(i: int, chunk: Document, req_chain, ctrl_chain, doc_name: str) -> Tuple[int, List[Dict[str, Any]]]:
-    """Process a single chunk: extract requirements and controls."""
-    section_id = chunk.metadata.get('section_id', 'unknown')
-    logging.info(f"Processing chunk {i+1}: Section {section_id}")
 
-    # Extract requirements
-    requirements = extract_requirements_from_chunk(req_chain, chunk, doc_name)
-    logging.info(f"Extracted {len(requirements)} requirements from chunk {i+1}")
+def group_identical_chunks(chunks: List[Document]) -> List[List[int]]:
+    """Group chunk indices by content hash, in order of first occurrence."""
+    groups: Dict[bytes, List[int]] = {}
+    for idx, chunk in enumerate(chunks):
+        key = hashlib.blake2b(chunk.page_content.encode(), digest_size=16).digest()
+        groups.setdefault(key, []).append(idx)
+    return list(groups.values())
 
-    results = []
-    # For each requirement, add controls and append
+
+def remember_controls(key: bytes, controls: List[Dict[str, Any]]) -> None:
+    """Store controls in the in-process cache, evicting the least recently used entry."""
+    _CONTROL_CACHE[key] = controls
+    _CONTROL_CACHE.move_to_end(key)
+    if len(_CONTROL_CACHE) > CONTROL_CACHE_SIZE:
+        _CONTROL_CACHE.popitem(last=False)
+
+
+async def attach_controls(requirements: List[Dict[str, Any]], batched_ctrl_chain, ctrl_chain) -> int:
+    """Give every occurrence of a requirement the same controls.
+
+    Controls normally come back with the requirement itself; only unique
+    requirements extracted without any (and not cached from an earlier
+    analysis) fall back to the control chains. Returns the number of
+    unique requirements that needed that fallback.
+    """
+    occurrences: Dict[bytes, List[Dict[str, Any]]] = {}
     for req in requirements:
-        controls = extract_controls_for_requirement(ctrl_chain, req)
-        req["controls"] = controls
-        results.append(req)
+        occurrences.setdefault(requirement_key(req.get("requirement", "")), []).append(req)
 
-    logging.info(f"Processed {len(requirements)} requirements from chunk {i+1}")
-    return i, results
+    known: Dict[bytes, List[Dict[str, Any]]] = {}
+    for key, group in occurrences.items():
+        controls = next((req["controls"] for req in group if req.get("controls")), None)
+        if controls:
+            known[key] = controls
+            remember_controls(key, controls)
+        elif key in _CONTROL_CACHE:
+            known[key] = _CONTROL_CACHE[key]
+            _CONTROL_CACHE.move_to_end(key)
 
+    misses = [key for key in occurrences if key not in known]
+    if misses:
+        miss_controls = await suggest_controls([occurrences[key][0] for key in misses], batched_ctrl_chain, ctrl_chain)
+        for key, controls in zip(misses, miss_controls):
+            known[key] = controls
+            if controls:  # Don't remember failed/empty suggestions
+                remember_controls(key, controls)
 
-def orchestrate_compliance_analysis(pdf_path: str, intermediate_filename: str) -> List[ComplianceRequirement]:
-    """Main orchestrator with parallel processing."""
-    from .document_loader import load_and_chunk_pdf
+    for key, group in occurrences.items():
+        for req in group:
+            req["controls"] = known[key]
+
+    return len(misses)
+
+
+def write_intermediate_results(all_results: List[Dict[str, Any]], article_texts: Dict[str, str], intermediate_filename: str) -> None:
+    """Write the ordered intermediate results as indented JSON (compressed for .zst names).
+
+    Section texts are written once in an "article_texts" map keyed by chunk
+    index (as a string); each requirement points into it through its article_text_ref.
+    """
+    write_json({"article_texts": article_texts, "requirements": all_results}, intermediate_filename)
+    logging.info(f"Wrote {len(all_results)} intermediate results to {intermediate_filename}")
+
+
+async def aorchestrate_compliance_analysis(pdf_path: str, intermediate_filename: str) -> List[ComplianceRequirement]:
+    """Main orchestrator with concurrent async LLM calls."""
+    from .document_loader import aload_and_chunk_pdf
 
-    # Load and chunk PDF
-    doc_type, doc_name, chunks = load_and_chunk_pdf(pdf_path)
+    # Load and chunk PDF in the process pool (CPU-bound, holds the GIL)
+    doc_type, doc_name, chunks = await aload_and_chunk_pdf(pdf_path)
     logging.info(f"Loaded and chunked PDF into {len(chunks)} chunks")
     logging.info(f"Document name: {doc_name}")
 
-    llm = create_llm()
-    req_chain = create_requirement_chain(llm, doc_name)
-    ctrl_chain = create_control_chain(llm)
+    req_chain = get_req_chain()
+    ctrl_chain = get_ctrl_chain()
+    batched_ctrl_chain = get_batched_ctrl_chain()
+
+    all_requirements: List[Dict[str, Any]] = []  # Requirements in chunk order, grown as chunks complete
+    ordered_buffer: List[Optional[List[Dict[str, Any]]]] = [None] * len(chunks)  # Completed chunks not yet in order
+    next_chunk = 0
+    completed = 0
+    last_flush = time.monotonic()
+
+    # Identical chunks (repeated boilerplate pages) go to the LLM once
+    chunk_groups = group_identical_chunks(chunks)
+    req_inputs = [requirement_input(chunks[group[0]], doc_name) for group in chunk_groups]
+    logging.info(f"Extracting requirements from {len(chunk_groups)} unique chunks out of {len(chunks)}")
+
+    # Append each chunk's requirements to a JSON Lines checkpoint as they
+    # complete; the pretty intermediate JSON is written once at the end
+    # A unique suffix keeps runs given the same intermediate name from sharing a checkpoint
+    checkpoint_base = os.path.splitext(intermediate_filename.removesuffix(ZSTD_SUFFIX))[0]
+    checkpoint_filename = f"{checkpoint_base}.{uuid.uuid4().hex}.jsonl"
+    with open(checkpoint_filename, 'wb') as checkpoint:
+        async for group_idx, raw_output in req_chain.abatch_as_completed(req_inputs, return_exceptions=True):
+            # One output serves every copy of the chunk, each with its own section number
+            for chunk_idx in chunk_groups[group_idx]:
+                chunk_results = requirements_from_output(chunk_idx, requirement_input(chunks[chunk_idx], doc_name), raw_output)
+                completed += 1
+                logging.info(f"Extracted {len(chunk_results)} requirements from chunk {chunk_idx+1}")
+
+                # Append every chunk that is now next in document order
+                ordered_buffer[chunk_idx] = chunk_results
+                while next_chunk < len(chunks) and ordered_buffer[next_chunk] is not None:
+                    all_requirements.extend(ordered_buffer[next_chunk])
+                    ordered_buffer[next_chunk] = None  # Release the slot once flattened
+                    next_chunk += 1
+
+                checkpoint.write(orjson.dumps({
+                    "chunk_idx": chunk_idx,
+                    "article_text": chunks[chunk_idx].page_content,  # Stored once per chunk
+                    "items": chunk_results
+                }) + b"\n")
+
+            # Debounce flushes; closing the file flushes whatever remains
+            if time.monotonic() - last_flush > CHECKPOINT_INTERVAL_SECONDS:
+                await asyncio.to_thread(checkpoint.flush)
+                last_flush = time.monotonic()
+                logging.info(f"Checkpointed to {checkpoint_filename} after {completed}/{len(chunks)} chunks")
+
+    # Share controls across duplicate requirements and fill in any the extraction missed
+    fallback_count = await attach_controls(all_requirements, batched_ctrl_chain, ctrl_chain)
+    logging.info(f"Suggested controls separately for {fallback_count} unique requirements out of {len(all_requirements)}")
+
+    # Each referenced section text is stored once, not once per requirement
+    article_texts = {
+        req['article_text_ref']: chunks[int(req['article_text_ref'])].page_content
+        for req in all_requirements
+    }
+    # Serialization, compression and validation are CPU-bound; run them in a
+    # worker thread so other analyses' LLM calls keep being scheduled
+    await asyncio.to_thread(write_intermediate_results, all_requirements, article_texts, intermediate_filename)
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(checkpoint_filename)
+
+    final_results = await asyncio.to_thread(validate_requirements, all_requirements, article_texts)
+    logging.info(f"Successfully validated {len(final_results)} requirements out of {len(all_requirements)} extracted")
+    return final_results
 
-    results = {}  # Dictionary to store results by chunk index
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=settings.max_workers) as executor:
-        # Submit all chunk processing tasks
-        future_to_chunk = {
-            executor.submit(process_chunk, i, chunk, req_chain, ctrl_chain, doc_name): i
-            for i, chunk in enumerate(chunks)
+def validate_requirements(all_requirements: List[Dict[str, Any]], article_texts: Dict[str, str]) -> List[ComplianceRequirement]:
+    """Validate requirements in chunk order, resolving article_text_ref to the shared section text."""
+    # Fresh dicts; all_requirements is left untouched so validation can be repeated
+    req_dicts = [
+        {
+            **{key: value for key, value in req_data.items() if key != 'article_text_ref'},
+            'article_text': article_texts[req_data['article_text_ref']]
         }
+        for req_data in all_requirements
+    ]
+    try:
+        # Whole list in one pass through pydantic-core
+        return _REQUIREMENT_LIST_ADAPTER.validate_python(req_dicts)
+    except ValidationError:
+        return validate_each(req_dicts)
 
-        # Process completed futures as they finish
-        for future in concurrent.futures.as_completed(future_to_chunk):
-            chunk_idx, chunk_results = future.result()
-            results[chunk_idx] = chunk_results
-
-            # Flatten all completed results in order
-            all_results = [item for idx in sorted(results.keys()) for item in results[idx]]
-
-            # Save intermediate results after each chunk completion
-            with open(intermediate_filename, 'w', encoding='utf-8') as f:
-                json.dump(all_results, f, indent=2, ensure_ascii=False)
-            logging.info(f"Updated intermediate results in {intermediate_filename} after {len(results)}/{len(chunks)} chunks")
 
-    # Flatten final results in chunk order and validate models
+def validate_each(req_dicts: List[Dict[str, Any]]) -> List[ComplianceRequirement]:
+    """Validate requirements one at a time, skipping invalid ones."""
     final_results = []
-    for idx in sorted(results.keys()):
-        for req_data in results[idx]:
-            try:
-                # Try to validate as ComplianceRequirement, skip if invalid
-                req = ComplianceRequirement.model_validate(req_data)
-                final_results.append(req)
-            except Exception as e:
-                logging.warning(f"Skipping invalid requirement: {e}")
-                logging.debug(f"Invalid data: {req_data}")
-                continue
-
-    logging.info(f"Successfully validated {len(final_results)} requirements out of {sum(len(v) for v in results.values())} extracted")
+    for req_data in req_dicts:
+        try:
+            # Try to validate as ComplianceRequirement, skip if invalid
+            req = ComplianceRequirement.model_validate(req_data)
+            final_results.append(req)
+        except Exception as e:
+            logging.warning(f"Skipping invalid requirement: {e}")
+            logging.debug(f"Invalid data: {req_data}")
+            continue
     return final_results
+
+
+def orchestrate_compliance_analysis(pdf_path: str, intermediate_filename: str) -> List[ComplianceRequirement]:
+    """Synchronous entry point for scripts; runs the async orchestrator in a fresh event loop."""
+    return asyncio.run(aorchestrate_compliance_analysis(pdf_path, intermediate_filename))
@@ -19,6 +19,28 @@ class ComplianceRequirement(BaseModel):
     controls: List[ControlSuggestion] = Field(default_factory=list, description="List of suggested controls")
 
 
+# Structured LLM output schemas. Article number and text are filled in from
+# the chunk, so the model is not asked to echo them back.
+class ExtractedRequirement(BaseModel):
+    requirement_title: str = Field(..., description="Descriptive title for the requirement")
+    priority: str = Field(..., description='"high" for core compliance mandates, "medium" for procedural requirements, "low" for administrative items')
+    requirement: str = Field(..., description="Concise requirement statement (the specific mandate)")
+    requirement_description: str = Field(..., description="Brief description of what the requirement means")
+    controls: List[ControlSuggestion] = Field(default_factory=list, description="Suggested controls for the requirement")
+
+
+class RequirementList(BaseModel):
+    requirements: List[ExtractedRequirement] = Field(default_factory=list, description="Enforceable requirements found, empty if none")
+
+
+class ControlList(BaseModel):
+    controls: List[ControlSuggestion] = Field(default_factory=list, description="Suggested controls for the requirement")
+
+
+class BatchedControlList(BaseModel):
+    results: List[ControlList] = Field(default_factory=list, description="One entry per requirement, in the order given")
+
+
 class AnalysisResult(BaseModel):
     document_name: str
     total_chunks: int = 0
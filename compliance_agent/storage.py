@@ -0,0 +1,41 @@
+import os
+from typing import Any, Iterator
+
+import orjson
+import zstandard
+
+# Files ending in this suffix are stored zstd-compressed
+ZSTD_SUFFIX = ".zst"
+ZSTD_LEVEL = 3
+
+# Read size when streaming files to and from disk
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def is_compressed(path: str) -> bool:
+    """Return whether the file at path is stored zstd-compressed."""
+    return path.endswith(ZSTD_SUFFIX)
+
+
+def write_json(obj: Any, path: str) -> None:
+    """Write obj as indented JSON, zstd-compressed when path ends in .zst.
+
+    The file is written to a temporary name and renamed into place, so
+    readers never see a partially written file.
+    """
+    data = orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    if is_compressed(path):
+        data = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def iter_json_bytes(path: str) -> Iterator[bytes]:
+    """Yield the (decompressed) JSON bytes of a file written by write_json."""
+    with open(path, 'rb') as fh:
+        reader = zstandard.ZstdDecompressor().stream_reader(fh) if is_compressed(path) else fh
+        while chunk := reader.read(STREAM_CHUNK_SIZE):
+            yield chunk
+
@@ -0,0 +1,81 @@
+import logging
+from datetime import datetime
+from typing import Optional, Dict, Any
+
+import orjson
+
+from .models import TaskStatus
+
+# Tasks expire from Redis one day after their last write
+TASK_TTL_SECONDS = 86400
+
+
+def _encode_fields(fields: Dict[str, Any]) -> Dict[str, str]:
+    """Encode each field as JSON so None and datetimes round-trip through a Redis hash."""
+    return {name: orjson.dumps(value).decode() for name, value in fields.items()}
+
+
+def _decode_fields(fields: Dict[str, str]) -> Dict[str, Any]:
+    """Decode a Redis hash written by _encode_fields."""
+    return {name: orjson.loads(value) for name, value in fields.items()}
+
+
+class TaskStore:
+    """Task status storage shared by all API workers.
+
+    Backed by Redis when a URL is given; otherwise falls back to process
+    memory, which only works with a single worker and is lost on restart.
+    """
+
+    def __init__(self, redis_url: Optional[str] = None):
+        self._tasks: dict[str, TaskStatus] = {}
+        self._redis = None
+        if redis_url:
+            import redis.asyncio as redis
+            self._redis = redis.from_url(redis_url, decode_responses=True)
+            logging.info("Task store backed by Redis")
+        else:
+            logging.info("Task store kept in process memory (set REDIS_URL for multi-worker deployments)")
+
+    @staticmethod
+    def _key(task_id: str) -> str:
+        return f"task:{task_id}"
+
+    async def create(self, task: TaskStatus) -> None:
+        """Store a new task."""
+        if self._redis is None:
+            self._tasks[task.task_id] = task
+            return
+
+        key = self._key(task.task_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping=_encode_fields(task.model_dump()))
+            pipe.expire(key, TASK_TTL_SECONDS)
+            await pipe.execute()
+
+    async def get(self, task_id: str) -> Optional[TaskStatus]:
+        """Return the task, or None if it does not exist."""
+        if self._redis is None:
+            return self._tasks.get(task_id)
+
+        fields = await self._redis.hgetall(self._key(task_id))
+        if not fields:
+            return None
+        return TaskStatus.model_validate(_decode_fields(fields))
+
+    async def update(self, task_id: str, **fields: Any) -> None:
+        """Update individual task fields; only the given fields are written."""
+        fields.setdefault("updated_at", datetime.now())
+
+        if self._redis is None:
+            task_status = self._tasks[task_id]
+            for name, value in fields.items():
+                setattr(task_status, name, value)
+            return
+
+        # HSET of just the changed fields avoids read-modify-write races between workers
+        key = self._key(task_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping=_encode_fields(fields))
+            pipe.expire(key, TASK_TTL_SECONDS)
+            await pipe.execute()
@@ -53,42 +53,39 @@ def load_and_chunk_pdf(pdf_path: str) -> List[Document]:
     sample_text = documents[0].page_content[:1000] if documents else ""
     doc_type = detect_document_type(sample_text)
 
-    # Base separators
+    # Base separators (regexes, see is_separator_regex below)
     separators = [
-        "\n\n", "\n", " "  # Fallbacks
+        r"\n\n", r"\n", r" "  # Fallbacks
     ]
 
     # Document-specific chunking strategy
     if doc_type == "DPDP":
         # DPDP has sections like 18. (1), chapters, sec. markers
         separators = [
-            "\nSEC. ", "\nSection ", "\nCHAPTER ", "\nChapter ",
-            "\n\d+\. \(\d+\) ", "\n\d+\. ",  # "18. (1)", "12 "
-            "\n1. ", "\n2. ", "\n3. ", "\n4. ", "\n5. ", "\n6. ", "\n7. ", "\n8. ", "\n9. ", "\n10. ",
-            "\n11. ", "\n12. ", "\n13. ", "\n14. ", "\n15. ", "\n16. ", "\n17. ", "\n18. ", "\n19. ", "\n20. ",
-            "\n21. ", "\n22. ", "\n23. ", "\n24. ", "\n25. ", "\n26. ", "\n27. ", "\n28. ", "\n29. ", "\n30. ",
-            "\nAnnex ", "\nBibliography ", "\nAppendix "
+            r"\nSEC\. ", r"\nSection ", r"\nCHAPTER ", r"\nChapter ",
+            r"\n\d+\. \(\d+\) ", r"\n\d{1,3}\. ",  # "18. (1)", "12. "
+            r"\nAnnex ", r"\nBibliography ", r"\nAppendix "
         ] + separators
         chunk_size = 2000  # Moderate chunk size for legal content
     elif doc_type == "ISO":
         # ISO standards have systematic numbering with subsections
         separators = [
-            "\n\d+\.\d+\.\d+ ", "\n\d+\.\d+ ", "\n\d+\. ",  # Subdivision priority
-            "\nAnnex ", "\nBibliography ", "\nNormative references ",
-            "\n## ", "\n# "
+            r"\n\d+\.\d+\.\d+ ", r"\n\d+\.\d+ ", r"\n\d+\. ",  # Subdivision priority
+            r"\nAnnex ", r"\nBibliography ", r"\nNormative references ",
+            r"\n## ", r"\n# "
         ] + separators
         chunk_size = 2500  # Larger sections
     elif doc_type == "RBI":
         separators = [
-            "\n\d+\. ", "\n\d+\.\d+ ", "\nChapter ", "\nAnnexure ",
-            "\nRegulation ", "\nGuideline "
+            r"\n\d+\. ", r"\n\d+\.\d+ ", r"\nChapter ", r"\nAnnexure ",
+            r"\nRegulation ", r"\nGuideline "
         ] + separators
         chunk_size = 2200
     else:
         # General compliance documents
         separators = [
-            "\n\d+\. ", "\n\d+\.\d+ ", "\nChapter ", "\nSection ", "\nArticle ",
-            "\nClause ", "\nANNEX ", "\nAppendix "
+            r"\n\d+\. ", r"\n\d+\.\d+ ", r"\nChapter ", r"\nSection ", r"\nArticle ",
+            r"\nClause ", r"\nANNEX ", r"\nAppendix "
         ] + separators
         chunk_size = 2000
 
@@ -97,7 +94,8 @@ def load_and_chunk_pdf(pdf_path: str) -> List[Document]:
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=200,  # Consistent overlap
-        separators=separators
+        separators=separators,
+        is_separator_regex=True
     )
 
     chunks = text_splitter.split_documents(documents)